@@ -11,11 +11,11 @@ fuzzy degrees of clogging are saved as csv.
 
 """
 
-import flusstools.bed_analyst as bea
+import pandas as pd
+from flusstools import bedanalyst as bea
 
 
-# read a cvs file into a dataframe (global variable)
-df_samples = pd.read_csv("inputs-realdata.csv")
-df_samples = df_samples.iloc[:, 0:7]
+# read only the first seven columns of the cvs file into a dataframe (global variable)
+df_samples = pd.read_csv("inputs-realdata.csv", usecols=range(7))
 
-bea.degree_clogging.degree_clogging(df_samples, "output/output.csv")
+bea.degree_clogging(df_samples, "output/output.csv")
@@ -1,4 +1,7 @@
-from flusstools import bed_analyst
+import os
+import numpy as np
+import pandas as pd
+from flusstools import bedanalyst
 
 columns = ['kf_10cm_corr',
                'kf_15cm_corr',
@@ -13,13 +16,30 @@ new_depths = np.array([0.1, 0.15, 0.2, 0.25, 0.3, 0.4, 0.5, 0.6])
 meas_at_cols = ('depth_correc [m]', 'kf (Wooster et al. (2008)) [m/s]')
 lonlat = ('lon', 'lat')
 
-# read excel as df
-df = pd.read_excel('slurp-data.xlsx', engine='openpyxl', skiprows=[1])
+sample_column = 'sample'
+xlsx_file = 'slurp-data.xlsx'
+cache_file = 'slurp-data.pkl'
+use_cols = [sample_column, *lonlat, *meas_at_cols]
 
-bed_analyst.interp_z2shp(df,
+# read excel as df - only the columns that interp_z2shp needs; parsing the workbook with openpyxl is slow,
+# therefore, the df is cached and re-used as long as the workbook is not modified and the columns are the same
+df = None
+if os.path.isfile(cache_file) and os.path.getmtime(cache_file) >= os.path.getmtime(xlsx_file):
+    try:
+        df = pd.read_pickle(cache_file)
+    except Exception:
+        # unreadable pickle (e.g., truncated or written by an incompatible pandas version): re-parse the workbook
+        df = None
+    if df is not None and set(df.columns) != set(use_cols):
+        df = None
+if df is None:
+    df = pd.read_excel(xlsx_file, engine='openpyxl', skiprows=[1], usecols=use_cols)
+    df.to_pickle(cache_file)
+
+bedanalyst.interp_z2shp(df,
              lonlat=lonlat,
              crs='epsg:3857',
-             sample_column='sample',
+             sample_column=sample_column,
              interp_at_z_stamps=new_depths,
              new_attr_names=columns,
              meas_at_cols=meas_at_cols,
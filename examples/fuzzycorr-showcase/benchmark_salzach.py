@@ -0,0 +1,305 @@
+"""Benchmark of the fuzzycorr pipeline (pre-processing, classification, fuzzy comparison, and plotting) with
+synthetic data that are scaled from the Salzach showcase extent. The run times and peak memory of every pipeline
+step are written to a json file in the benchmark directory after every scale, which can be compared between
+flusstools releases.
+
+Every step runs in a forked child process, which reports its run time and its peak resident set size (RSS),
+including the buffers that GDAL and rasterio allocate outside of Python (requires Linux or macOS). A step that
+raises an error is recorded with its error message instead of a measurement, the steps that depend on it are
+recorded as skipped, and the pipeline continues where possible (if ``norm_array`` fails, the synthetic dz-field is
+evaluated at the cell centers instead).
+"""
+import json
+import multiprocessing
+import platform
+import resource
+import sys
+import timeit
+from datetime import datetime
+from importlib import metadata
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from flusstools import fuzzycorr as fc
+from flusstools.geotools import clip_raster
+
+# ------------------------INPUT--------------------------------------
+# Salzach showcase extent and raster characteristics (see prepro_salzach.py)
+ulc = (4571800, 5308230)
+lrc = (4575200, 5302100)
+res = 5
+crs = 'EPSG:5684'
+nodatavalue = -9999
+attribute = 'dz'
+
+# Scale factors applied to the side lengths of the Salzach extent and number of synthetic points per km2
+scales = [0.1, 0.25, 0.5]
+points_per_km2 = 2000
+
+# Pipeline parameters
+interpol_method = 'cubic'
+alpha = 0.01
+n_classes = 12
+n = 8
+halving_distance = 4
+
+# Number of timed repetitions per step (the fastest run is reported) and seed of the synthetic data (every scale
+# uses its own random stream derived from the seed)
+repeat = 1
+seed = 42
+
+current_dir = Path.cwd()
+bench_dir = current_dir / 'benchmark'
+Path(bench_dir).mkdir(exist_ok=True)
+# ------------------------------------------------------------------
+
+# forked child processes inherit the pipeline objects; ru_maxrss is in KiB on Linux and in bytes on macOS
+process_context = multiprocessing.get_context('fork')
+rss_per_mib = 2 ** 20 if sys.platform == 'darwin' else 2 ** 10
+
+
+def dz_field(x, y, shift=0.):
+    """Smooth synthetic pattern of erosion and deposition.
+
+    Args:
+        x (numpy.ndarray): Easting coordinates
+        y (numpy.ndarray): Northing coordinates
+        shift (float): Shift of the pattern in x-direction (mimics a simulation that is slightly off)
+
+    Returns:
+        numpy.ndarray: Bed elevation change (dz) at ``x``, ``y``
+    """
+    return 2.0 * np.sin((x - ulc[0] + shift) / 400.) * np.cos((y - lrc[1]) / 600.)
+
+
+def synthetic_points(scale, rng):
+    """Create a synthetic observed and simulated point cloud of bed elevation change.
+
+    Args:
+        scale (float): Scale factor for the side lengths of the Salzach extent
+        rng (numpy.random.Generator): Seeded random number generator
+
+    Returns:
+        tuple: Lower right corner, and the observed and simulated ``pandas.DataFrame``
+    """
+    width = (lrc[0] - ulc[0]) * scale
+    height = (ulc[1] - lrc[1]) * scale
+    scaled_lrc = (ulc[0] + width, ulc[1] - height)
+    n_points = max(int(points_per_km2 * width * height / 1e6), 100)
+
+    x = rng.uniform(ulc[0], scaled_lrc[0], n_points)
+    y = rng.uniform(scaled_lrc[1], ulc[1], n_points)
+    dz_obs = dz_field(x, y) + rng.normal(0., 0.3, n_points)
+    dz_sim = dz_field(x, y, shift=50.) + rng.normal(0., 0.5, n_points)
+
+    df_obs = pd.DataFrame({'Easting [m]': x, 'Northing [m]': y, attribute: dz_obs})
+    df_sim = pd.DataFrame({'Easting [m]': x, 'Northing [m]': y, attribute: dz_sim})
+    return scaled_lrc, df_obs, df_sim
+
+
+def error(exception):
+    """Describe an exception that a pipeline step raised.
+
+    Args:
+        exception (BaseException): Raised exception (including ``SystemExit``)
+
+    Returns:
+        dict: Error message of the step
+    """
+    return {'error': '%s: %s' % (type(exception).__name__, str(exception))}
+
+
+def run_child(connection, function, args, kwargs):
+    """Run and measure a function in a child process and send the result and measurement to the parent process.
+
+    Args:
+        connection (multiprocessing.connection.Connection): Sending end of a pipe to the parent process
+        function (callable): Function to benchmark
+        args (tuple): Positional arguments of ``function``
+        kwargs (dict): Keyword arguments of ``function``
+    """
+    try:
+        rss_start = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        times = []
+        for _ in range(repeat):
+            start = timeit.default_timer()
+            result = function(*args, **kwargs)
+            times.append(timeit.default_timer() - start)
+        rss_peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        connection.send((result, {'time_s': min(times),
+                                  'peak_rss_mib': rss_peak / rss_per_mib,
+                                  'peak_rss_increase_mib': (rss_peak - rss_start) / rss_per_mib}))
+    except BaseException as e:
+        connection.send((None, error(e)))
+    finally:
+        connection.close()
+
+
+def measure(function, *args, **kwargs):
+    """Measure the run time and the peak memory of a function call in a forked child process. The child process
+    starts with the memory of the benchmark process, and the peak resident set size (RSS) of the child process
+    also covers memory that GDAL and rasterio allocate outside of Python.
+
+    Args:
+        function (callable): Function to benchmark
+        *args: Positional arguments of ``function``
+        **kwargs: Keyword arguments of ``function``
+
+    Returns:
+        tuple: Return value of the last call (``None`` if it failed) and a ``dict`` with the fastest run time [s],
+        the peak RSS of the child process [MiB], and the increase of the peak RSS during the calls [MiB] (or the
+        error message)
+    """
+    receiver, sender = process_context.Pipe(duplex=False)
+    child = process_context.Process(target=run_child, args=(sender, function, args, kwargs))
+    child.start()
+    sender.close()
+    try:
+        result, measurement = receiver.recv()
+    except EOFError:
+        # the child process died without reporting (e.g., killed because it ran out of memory)
+        result, measurement = None, None
+    child.join()
+    if measurement is None:
+        measurement = {'error': 'child process terminated with exit code %s' % str(child.exitcode)}
+    return result, measurement
+
+
+def run_step(steps, name, requires, function, *args, setup=False, **kwargs):
+    """Run one pipeline step unless a step that it requires failed or was skipped. Benchmarked steps are
+    measured in a child process (see ``measure``). Setup steps (e.g., constructors) run in the benchmark process
+    and are only recorded if they fail or are skipped.
+
+    Args:
+        steps (dict): Measurements of the pipeline steps (updated with the measurement of the step)
+        name (str): Name of the step
+        requires (tuple): Names of the steps that must have succeeded
+        function (callable): Function of the step
+        *args: Positional arguments of ``function``
+        setup (bool): If ``True``, run ``function`` without measuring it
+        **kwargs: Keyword arguments of ``function``
+
+    Returns:
+        Return value of ``function`` (``None`` if the step failed or was skipped)
+    """
+    for required_step in requires:
+        if 'error' in steps.get(required_step, {}):
+            steps[name] = {'skipped': '%s failed' % required_step}
+            return None
+        if 'skipped' in steps.get(required_step, {}):
+            steps[name] = {'skipped': '%s was skipped' % required_step}
+            return None
+    if not setup:
+        result, steps[name] = measure(function, *args, **kwargs)
+        return result
+    try:
+        return function(*args, **kwargs)
+    except (Exception, SystemExit) as e:
+        # flusstools calls sys.exit on some input errors
+        steps[name] = error(e)
+        return None
+
+
+def run_pipeline(scale):
+    """Run and measure all fuzzycorr pipeline steps for one synthetic dataset.
+
+    Args:
+        scale (float): Scale factor for the side lengths of the Salzach extent
+
+    Returns:
+        dict: Characteristics of the dataset and the measurements of every step
+    """
+    rng = np.random.default_rng([seed, int(round(scale * 100))])
+    scaled_lrc, df_obs, df_sim = synthetic_points(scale, rng)
+    case = 'scale%s' % str(scale).replace('.', '_')
+    poly_path = str(bench_dir / (case + '_polygon.shp'))
+    steps = {}
+
+    rasters = {}
+    map_file = None
+    for name, df, shift in (('obs', df_obs, 0.), ('sim', df_sim, 50.)):
+        raster_out = str(bench_dir / ('%s_%s.tif' % (case, name)))
+        rasters[name] = str(bench_dir / ('%s_%s_clipped.tif' % (case, name)))
+        map_file = run_step(steps, 'FuzzyPreProcessor_' + name, (), fc.FuzzyPreProcessor, df, setup=True,
+                            attribute=attribute, crs=crs, nodatavalue=nodatavalue, res=res, ulc=ulc, lrc=scaled_lrc)
+        array_ = run_step(steps, 'norm_array_' + name, ('FuzzyPreProcessor_' + name,),
+                          getattr(map_file, 'norm_array', None), method=interpol_method)
+        if array_ is None and map_file is not None:
+            # evaluate the synthetic field at the cell centers to keep the following steps running
+            xx, yy = np.meshgrid(map_file.xmin + res * (np.arange(map_file.ncol) + 0.5),
+                                 map_file.ymax - res * (np.arange(map_file.nrow) + 0.5))
+            array_ = dz_field(xx, yy, shift=shift)
+        run_step(steps, 'array2raster_' + name, ('FuzzyPreProcessor_' + name,),
+                 getattr(map_file, 'array2raster', None), array_, raster_out, setup=True, save_ascii=False)
+        if name == 'obs':
+            # re-build the polygon in every run (not measured) so that it always matches the synthetic points
+            run_step(steps, 'create_polygon', ('FuzzyPreProcessor_obs',), getattr(map_file, 'create_polygon', None),
+                     poly_path, setup=True, alpha=alpha)
+        run_step(steps, 'clip_raster_' + name, ('array2raster_' + name, 'create_polygon'), clip_raster, poly_path,
+                 raster_out, rasters[name])
+
+    raster_obs = run_step(steps, 'CategorizationPreProcessor', ('clip_raster_obs',), fc.CategorizationPreProcessor,
+                          rasters['obs'], setup=True)
+    classes = run_step(steps, 'nb_classes', ('CategorizationPreProcessor',), getattr(raster_obs, 'nb_classes', None),
+                       n_classes)
+    if classes is not None:
+        classes = np.insert(classes, 0, -np.inf, axis=0)
+        classes[-1] = np.inf
+    run_step(steps, 'categorize_raster', ('nb_classes',), getattr(raster_obs, 'categorize_raster', None), classes,
+             map_out=str(bench_dir / (case + '_obs_class.tif')), save_ascii=False)
+
+    comparison_name = case + '_sim_versus_obs'
+    compare = run_step(steps, 'FuzzyComparison', ('clip_raster_obs', 'clip_raster_sim'), fc.FuzzyComparison,
+                       rasters['sim'], rasters['obs'], n, halving_distance, setup=True)
+    global_simil = run_step(steps, 'fuzzy_numerical', ('FuzzyComparison',), getattr(compare, 'fuzzy_numerical', None),
+                            comparison_name, save_dir=str(bench_dir))
+
+    raster = run_step(steps, 'RasterDataPlotter', ('fuzzy_numerical',), fc.RasterDataPlotter,
+                      str(bench_dir / (comparison_name + '.tif')), setup=True)
+    run_step(steps, 'plot_continuous_raster', ('RasterDataPlotter',), getattr(raster, 'plot_continuous_raster', None),
+             str(bench_dir / (comparison_name + '.png')), 'inferno')
+    run_step(steps, 'make_hist', ('RasterDataPlotter',), getattr(raster, 'make_hist', None), 'Fuzzy Similarity [-]',
+             'Frequency', fontsize=15, output_file=str(bench_dir / (comparison_name + '_hist.png')), figsize=(10, 4))
+
+    return {'scale': scale,
+            'cols': getattr(map_file, 'ncol', None),
+            'rows': getattr(map_file, 'nrow', None),
+            'points': len(df_obs),
+            'global_similarity': None if global_simil is None else float(global_simil),
+            'steps': steps}
+
+
+if __name__ == '__main__':
+    try:
+        flusstools_version = metadata.version('flusstools')
+    except metadata.PackageNotFoundError:
+        flusstools_version = 'unknown'
+
+    results = {'flusstools': flusstools_version,
+               'numpy': np.__version__,
+               'python': platform.python_version(),
+               'platform': platform.platform(),
+               'date': datetime.now().isoformat(timespec='seconds'),
+               'seed': seed,
+               'repeat': repeat,
+               'cases': []}
+
+    result_file = bench_dir / ('benchmark_flusstools_%s.json' % flusstools_version)
+    for scale in scales:
+        print(' * benchmarking scale %s ...' % str(scale))
+        case_results = run_pipeline(scale)
+        for step, measurement in case_results['steps'].items():
+            if 'error' in measurement:
+                print('   - %s: FAILED (%s)' % (step, measurement['error']))
+            elif 'skipped' in measurement:
+                print('   - %s: SKIPPED (%s)' % (step, measurement['skipped']))
+            else:
+                print('   - %s: %.3f s, %.1f MiB peak RSS (+%.1f MiB)' % (step, measurement['time_s'],
+                                                                        measurement['peak_rss_mib'],
+                                                                        measurement['peak_rss_increase_mib']))
+        results['cases'].append(case_results)
+
+        # write the results after every scale so that a crash in a later scale does not lose them
+        with open(result_file, 'w') as f:
+            json.dump(results, f, indent=2)
+        print('   benchmark results written to %s' % str(result_file))
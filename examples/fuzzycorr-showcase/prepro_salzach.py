@@ -1,4 +1,5 @@
 from pathlib import Path
+import hashlib
 import fuzzycorr.prepro as pp
 import pandas as pd
 
@@ -13,8 +14,9 @@ list_files = ['vali_hydro_FT_manual_2013',
 attribute = 'dz'
 interpol_method = 'cubic'
 
-# Polygon of area of interest
+# Polygon of area of interest and excentricity of its alphashape
 polyname = 'polygon_salzach'
+alpha = 0.01
 
 #  Raster Resolution: Change as appropriate
 #  NOTE: Fuzzy Analysis has unique resolution
@@ -35,6 +37,15 @@ Path(current_dir / 'rasters').mkdir(exist_ok=True)
 
 poly_path = str(current_dir / 'shapefiles') + '/' + polyname + '.shp'
 
+# All files cover the same domain: the polygon is only re-built if the raw data or alpha changed, which is
+# tracked with a hash stored next to the shapefile
+poly_hash = hashlib.sha256(str(alpha).encode())
+for file in list_files:
+    poly_hash.update(Path(current_dir / 'raw_data' / (file + '.csv')).read_bytes())
+poly_key = poly_hash.hexdigest()
+poly_key_file = Path(poly_path).with_suffix('.sha256')
+build_polygon = not (Path(poly_path).exists() and poly_key_file.exists() and poly_key_file.read_text() == poly_key)
+
 # -----------------------------------------------------------------------
 
 for file in list_files:
@@ -53,5 +64,8 @@ for file in list_files:
 
     # Clip raster and save it
     clip_raster = str(current_dir / 'rasters') + '/' + file + '_res5_clipped' + '.tif'
-    map_file.create_polygon(poly_path, alpha=0.01)
+    if build_polygon:
+        map_file.create_polygon(poly_path, alpha=alpha)
+        poly_key_file.write_text(poly_key)
+        build_polygon = False
     pp.clip_raster(poly_path, raster_out, clip_raster)
@@ -3,14 +3,159 @@ The TIF files in this example have a prefix and suffix name, which are separated
 The origin of the new GeoTIFF files is derived from a KML file.
 """
 
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pyproj
+from osgeo import gdal
 
 # import geo_utils - and this script also requires pyproj (install with pyshp)
 from flusstools.geotools import *
 
 
-@cache
+def read_image_index(gdf_kml):
+    """Parse all KML placemarks at once into image numbers and origin coordinates.
+
+    Args:
+        gdf_kml (geopandas.GeoDataFrame): Placemarks as returned by ``kmx2other(..., output="gpd")``
+
+    Returns:
+        tuple: Image numbers (``list`` of ``int``), longitudes, and latitudes (``pandas.Series`` of ``float``)
+    """
+    img_numbers = gdf_kml["description"].str.split("Image Number=<td><b>").str[-1].str.split("</b>").str[0]
+    coordinates = gdf_kml["coordinates"].str.split(",", expand=True).astype(float)
+    return [int(img_no) for img_no in img_numbers], coordinates[0], coordinates[1]
+
+
+def is_valid_raster(file_name, band_count=3, tiled=False, block_size=256, compress="DEFLATE", overviews=False):
+    """Check if a previously written GeoTIFF exists, can be opened with all bands, and has the requested output
+    profile. GeoTIFFs are only written under their final name once they are complete (see ``georeference_tiff``).
+
+    Args:
+        file_name (str): Directory of the GeoTIFF
+        band_count (int): Expected number of bands
+        tiled (bool): Expect an internally tiled GeoTIFF with ``block_size`` and ``compress`` (otherwise striped)
+        block_size (int): Expected edge length of the internal tiles in pixels (only used if ``tiled=True``)
+        compress (str): Expected GDAL compression codec (only used if ``tiled=True``)
+        overviews (bool): Expect internal overview pyramids
+
+    Returns:
+        bool: ``True`` if the file can be reused, otherwise ``False``
+    """
+    if not os.path.isfile(file_name):
+        return False
+    try:
+        ras = gdal.Open(file_name)
+    except RuntimeError:
+        # corrupt file and GDAL exceptions are enabled
+        return False
+    if ras is None or ras.RasterCount != band_count:
+        return False
+    band = ras.GetRasterBand(1)
+    block_x, block_y = band.GetBlockSize()
+    if tiled:
+        # GDAL does not report a COMPRESSION item for uncompressed GeoTIFFs
+        compression = ras.GetMetadataItem("COMPRESSION", "IMAGE_STRUCTURE") or "NONE"
+        if (block_x, block_y) != (block_size, block_size) or compression.upper() != compress.upper():
+            return False
+    elif block_x != ras.RasterXSize:
+        # striped GeoTIFFs have blocks that span the full raster width
+        return False
+    return band.GetOverviewCount() >= 4 if overviews else True
+
+
+def creation_options(tiled=False, block_size=256, compress="DEFLATE"):
+    """Get GDAL creation options for the projected RGB GeoTIFFs.
+
+    Args:
+        tiled (bool): If ``True``, write internally tiled and compressed GeoTIFFs, which viewers and windowed
+            readers can access without scanning the full file (default: ``False`` writes plain striped GeoTIFFs)
+        block_size (int): Edge length of the internal tiles in pixels (must be a multiple of 16)
+        compress (str): GDAL compression codec for tiled GeoTIFFs (e.g., ``"DEFLATE"``, ``"LZW"``, ``"ZSTD"``,
+            or ``"NONE"``) - the horizontal differencing predictor is added for ``"DEFLATE"``, ``"LZW"``, ``"ZSTD"``,
+            and ``"LZMA"``
+
+    Returns:
+        list: GDAL creation options
+
+    Raises:
+        ValueError: If ``tiled=True`` and ``block_size`` is not a positive multiple of 16
+    """
+    if tiled and (block_size <= 0 or block_size % 16):
+        raise ValueError("block_size must be a positive multiple of 16 (provided: %s)" % str(block_size))
+    options = ["PHOTOMETRIC=RGB", "PROFILE=GeoTIFF"]
+    if tiled:
+        options += ["TILED=YES", "BLOCKXSIZE=%i" % block_size, "BLOCKYSIZE=%i" % block_size,
+                    "COMPRESS=%s" % compress]
+        if compress.upper() in ("DEFLATE", "LZW", "ZSTD", "LZMA"):
+            options.append("PREDICTOR=2")
+    return options
+
+
+def georeference_tiff(tiff_name, tar_tiff_name, origin, epsg_tar, options=None, overviews=False):
+    """Write one georeferenced copy of a non-georeferenced RGB TIFF.
+
+    Args:
+        tiff_name (str): Directory of the source (non-georeferenced) TIFF
+        tar_tiff_name (str): Directory of the projected GeoTIFF to create
+        origin (tuple): Origin (x, y) of the projected GeoTIFF in the target spatial reference system
+        epsg_tar (int): Authority code of the target spatial reference system
+        options (list): GDAL creation options (default: ``None`` uses ``creation_options()``)
+        overviews (bool): If ``True``, add internal overview pyramids (2, 4, 8, and 16) to the projected GeoTIFF
+
+    Returns:
+        str: Directory of the projected GeoTIFF
+
+    Raises:
+        RuntimeError: If the projected GeoTIFF cannot be created
+    """
+    print(" * identified raster name %s ..." % tiff_name)
+
+    print("   - opening R, G, and B arrays of the source raster ... ")
+    # open the source raster only once and read all bands in one (bands, rows, cols) array
+    src_ras = gdal.Open(tiff_name)
+    rgb_array = src_ras.ReadAsArray(band_list=[1, 2, 3])
+    # summarize RGB array in  list and overwrite NoDataValues with np.nan (like raster2array does), which
+    # create_raster replaces with nan_val
+    rgb = []
+    for band_number, band_array in enumerate(rgb_array, start=1):
+        band_array = band_array.astype(float)
+        nodata = src_ras.GetRasterBand(band_number).GetNoDataValue()
+        if nodata is not None:
+            band_array[band_array == nodata] = np.nan
+        rgb.append(band_array)
+    # release source raster
+    src_ras = None
+
+    print("   - creating new projected raster ... ")
+    # write to a temporary file that only gets the final name when it is complete, so that an interrupted
+    # run never leaves a truncated GeoTIFF that would be skipped on resume
+    part_tiff_name = tar_tiff_name + ".part"
+    status = create_raster(file_name=part_tiff_name,
+                           raster_array=rgb,
+                           epsg=epsg_tar,
+                           origin=origin,
+                           nan_val=0,
+                           pixel_width=0.1,
+                           pixel_height=0.1,
+                           rdtype=gdal.GDT_UInt16,
+                           rotation_angle=178.,
+                           shear_pixels=False,
+                           options=options or creation_options())
+    if status != 0:
+        raise RuntimeError("Could not create %s." % tar_tiff_name)
+    if overviews:
+        print("   - building overviews ... ")
+        tar_ras = gdal.Open(part_tiff_name, gdal.GA_Update)
+        tar_ras.BuildOverviews("AVERAGE", [2, 4, 8, 16])
+        tar_ras = None
+    os.replace(part_tiff_name, tar_tiff_name)
+    return tar_tiff_name
+
+
 def project_tiffs(kml_dir, src_tiff_dir, epsg_tar, epsg_src=4326, tiff_prefix="", tiff_suffix=".tif",
-                  tar_tiff_dir="/", pixel_width=1.0):
+                  tar_tiff_dir="/", pixel_width=1.0, workers=None, overwrite=False,
+                  tiled=False, block_size=256, compress="DEFLATE", overviews=False):
     """Project non-georeferenced GeoTIFFs from a source EPSG on to a target EPSG
     and use KML placemarks as origins for the new projections.
 
@@ -23,53 +168,59 @@ def project_tiffs(kml_dir, src_tiff_dir, epsg_tar, epsg_src=4326, tiff_prefix=""
         pixel_width (``float`` or ``int``): Defines the size of one pixel relative to the base unit system (e.g., if 1 and the base unit system is metric, then the ``pixel_size`` is 1 m)
         tiff_prefix (str): An optional prefix to narrow down source TIFF file names to use - do not include a directory
         tiff_suffix (str): An optional suffix to narrow down source TIFF file names to use - must end on ``'.tif'``
+        workers (int): Number of parallel processes (default: ``None`` uses all available CPUs)
+        overwrite (bool): If ``False`` (default), valid GeoTIFFs from a previous (interrupted) run that have the
+            requested output profile (``tiled``, ``block_size``, ``compress``, ``overviews``) are kept and skipped
+        tiled (bool): If ``True``, write internally tiled and compressed GeoTIFFs (see ``creation_options()``)
+        block_size (int): Edge length of the internal tiles in pixels - must be a multiple of 16 (only used if
+            ``tiled=True``)
+        compress (str): GDAL compression codec (only used if ``tiled=True``)
+        overviews (bool): If ``True``, add internal overview pyramids to every projected GeoTIFF
+
+    Returns:
+        list: Directories of the projected (and skipped) GeoTIFFs in the order of the KML placemarks
+
+    Raises:
+        ValueError: If ``tiled=True`` and ``block_size`` is not a positive multiple of 16
     """
+    # check the output profile before any raster is processed
+    options = creation_options(tiled=tiled, block_size=block_size, compress=compress)
 
     # check if the target directory exists
     if not os.path.isdir(tar_tiff_dir):
         os.mkdir(tar_tiff_dir)
 
-    # read kml file as geopandas dataframe
+    # read kml file as geopandas dataframe and parse all placemarks once
     gdf_kml = kmx2other(kml_dir, output="gpd")
+    print(" * retrieving image numbers and origin coordinates from kml")
+    img_numbers, longs, lats = read_image_index(gdf_kml)
 
-    # define source and target coordinate systems
+    # define source and target coordinate systems and transform all origins in one call
     kml_crs = pyproj.CRS("EPSG:%s" % str(epsg_src))
     tar_crs = pyproj.CRS("EPSG:%s" % str(epsg_tar))
     transformer = pyproj.Transformer.from_crs(kml_crs, tar_crs)
+    xs, ys = transformer.transform(lats.values, longs.values)
 
     # retrieve prefix name of tiff files
     tiff_prefix_dir = "{0}{1}".format(src_tiff_dir, tiff_prefix)
 
-    for i in range(gdf_kml["coordinates"].__len__()):
-        img_no = int(gdf_kml["description"][i].split("Image Number=<td><b>")[-1].split("</b>")[0])
-        tiff_name = tiff_prefix_dir + "%0004i" % img_no + tiff_suffix
-        print(" * identified raster name %s ..." % tiff_name)
-
-        print("   - retrieving origin coordinates from kml")
-        long, lat, alt = (float(coord) for coord in gdf_kml["coordinates"][i].split(","))
-        x, y = transformer.transform(lat, long)
-
-        print("   - opening R, G, and B arrays of the source raster ... ")
-        src_ras, red_array, none_ref = raster2array(tiff_name, band_number=1)
-        src_ras, blue_array, none_ref = raster2array(tiff_name, band_number=2)
-        src_ras, green_array, none_ref = raster2array(tiff_name, band_number=3)
-        # release source raster
-        src_ras = None
-        # summarize RGB array in  list
-        rgb = [red_array, blue_array, green_array]
-
-        print("   - creating new projected raster ... ")
-        create_raster(file_name=tar_tiff_dir + tiff_prefix + "%0004i" % img_no + "_georef.tif",
-                      raster_array=rgb,
-                      epsg=epsg_tar,
-                      origin=(x, y),
-                      nan_val=0,
-                      pixel_width=0.1,
-                      pixel_height=0.1,
-                      rdtype=gdal.GDT_UInt16,
-                      rotation_angle=178.,
-                      shear_pixels=False,
-                      options=["PHOTOMETRIC=RGB", "PROFILE=GeoTIFF"])
+    # keep the results in placemark order (same order as img_numbers) for skipped and new GeoTIFFs
+    tar_tiff_names = [None] * len(img_numbers)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        jobs = {}
+        for index, (img_no, x, y) in enumerate(zip(img_numbers, xs, ys)):
+            tiff_name = tiff_prefix_dir + "%0004i" % img_no + tiff_suffix
+            tar_tiff_name = tar_tiff_dir + tiff_prefix + "%0004i" % img_no + "_georef.tif"
+            if not overwrite and is_valid_raster(tar_tiff_name, tiled=tiled, block_size=block_size,
+                                                 compress=compress, overviews=overviews):
+                print(" * skipping %s (already georeferenced)" % tiff_name)
+                tar_tiff_names[index] = tar_tiff_name
+                continue
+            jobs[index] = executor.submit(georeference_tiff, tiff_name, tar_tiff_name, (x, y), epsg_tar,
+                                          options, overviews)
+        for index, job in jobs.items():
+            tar_tiff_names[index] = job.result()
+    return tar_tiff_names
 
 
 if __name__ == "__main__":
@@ -87,4 +238,7 @@ if __name__ == "__main__":
                   tiff_prefix=src_tiff_prefix,
                   tiff_suffix=src_tiff_suffix,
                   epsg_src=4326,
-                  epsg_tar=3857)
+                  epsg_tar=3857,
+                  workers=4,
+                  tiled=True,
+                  overviews=True)